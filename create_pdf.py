@@ -1,9 +1,11 @@
 # create_pdf.py
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 from PIL import Image
+import io
 import os
-import json
-from variables import PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT
+import math
+from variables import DPI, PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT
 
 # 6 × 9 inch page size (standard children's book)
 PAGE_WIDTH = PDF_PAGE_WIDTH
@@ -14,22 +16,82 @@ size = (PAGE_WIDTH, PAGE_HEIGHT)
 SPREAD_WIDTH = PAGE_WIDTH * 2
 spread_size = (SPREAD_WIDTH, PAGE_HEIGHT)
 
+# Embedded image settings: pixels needed to fill one page at print DPI
+IMAGE_TARGET_SIZE = (
+    math.ceil(PAGE_WIDTH / 72 * DPI),
+    math.ceil(PAGE_HEIGHT / 72 * DPI)
+)
+JPEG_QUALITY = 85
+# Keep full-resolution color (4:4:4). Pillow's default 4:2:0 subsampling
+# smears the thin colored story text and its 1px shadows.
+JPEG_SUBSAMPLING = 0
+
+# Decoded page images keyed by absolute path, so each PNG is decoded only
+# once. ReportLab names image XObjects by content hash, so drawing the same
+# reader twice in one canvas also embeds the image data only once.
+_image_readers = {}
+
+
+def get_image_reader(path):
+    """Return a cached ImageReader for path, decoding the image on first use.
+    
+    Images larger than one page at print DPI are downsampled, and all
+    images are re-encoded as JPEG without chroma subsampling so ReportLab
+    embeds the bytes as-is instead of deflating raw pixels.
+    """
+    key = os.path.abspath(path)
+    reader = _image_readers.get(key)
+    if reader is None:
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+            if (img.width > IMAGE_TARGET_SIZE[0]
+                    or img.height > IMAGE_TARGET_SIZE[1]):
+                img.thumbnail(IMAGE_TARGET_SIZE, Image.Resampling.LANCZOS,
+                              reducing_gap=3.0)
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=JPEG_QUALITY,
+                     subsampling=JPEG_SUBSAMPLING)
+        buffer.seek(0)
+        reader = ImageReader(buffer)
+        _image_readers[key] = reader
+    return reader
+
+
+def draw_blank_page(c, x=0):
+    """Paint a white page at x in place of a missing image."""
+    c.setFillColorRGB(1, 1, 1)
+    c.rect(x, 0, PAGE_WIDTH, PAGE_HEIGHT, fill=1, stroke=0)
+
+
+def draw_page_image(c, path, x=0):
+    """Draw a page image at x filling one page height.
+    
+    The image covers the whole page, so the white background is only
+    painted when the image is missing (returns False).
+    """
+    if not os.path.exists(path):
+        draw_blank_page(c, x)
+        return False
+    c.drawImage(get_image_reader(path), x, 0, width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    return True
+
+
 # Create output directory
 os.makedirs("output", exist_ok=True)
 
-# Load story data
+# Story data is baked into the page images; only require that it exists
 if not os.path.exists("story.json"):
     raise FileNotFoundError("story.json not found. Run generate_story.py first.")
 
-with open("story.json", "r") as f:
-    story_data = json.load(f)
-
 # Get list of page images from pages/ directory
 pages_dir = "pages"
 if not os.path.exists(pages_dir):
     raise FileNotFoundError("pages/ directory not found. Run generate_page.py first.")
 
-page_files = sorted([f for f in os.listdir(pages_dir) if f.endswith('.png')])
+with os.scandir(pages_dir) as entries:
+    page_files = sorted(
+        e.name for e in entries if e.name.endswith('.png') and e.is_file()
+    )
 
 if not page_files:
     raise FileNotFoundError("No page images found in pages/ directory.")
@@ -51,7 +113,7 @@ run_number = os.getenv('GITHUB_RUN_NUMBER', 'test')
 
 # === PDF 1: Story pages only (pages 01 to 20) ===
 story_pdf_filename = f"output/{run_number}_story.pdf"
-c1 = canvas.Canvas(story_pdf_filename, pagesize=size)
+c1 = canvas.Canvas(story_pdf_filename, pagesize=size, pageCompression=1)
 
 print(f"\nCreating story PDF with {len(story_files)} pages...")
 print(f"Page size: {PAGE_WIDTH}×{PAGE_HEIGHT} points")
@@ -60,13 +122,8 @@ print("=" * 60)
 for page_file in story_files:
     img_path = os.path.join(pages_dir, page_file)
     
-    # Draw white background
-    c1.setFillColorRGB(1, 1, 1)
-    c1.rect(0, 0, PAGE_WIDTH, PAGE_HEIGHT, fill=1)
-    
     # Draw the page image
-    if os.path.exists(img_path):
-        c1.drawImage(img_path, 0, 0, width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    if draw_page_image(c1, img_path):
         print(f"  ✅ Added: {page_file}")
     else:
         print(f"  ⚠️ Missing: {page_file}")
@@ -78,36 +135,33 @@ print(f"✅ Story PDF created: {story_pdf_filename}")
 
 # === PDF 2: Cover spread (end on left, cover on right) ===
 cover_pdf_filename = f"output/{run_number}_cover.pdf"
-c2 = canvas.Canvas(cover_pdf_filename, pagesize=spread_size)
+c2 = canvas.Canvas(cover_pdf_filename, pagesize=spread_size,
+                   pageCompression=1)
 
 print(f"\nCreating cover spread PDF...")
 print(f"Page size: {SPREAD_WIDTH}×{PAGE_HEIGHT} points (double-wide)")
 print("=" * 60)
 
-# Draw white background
-c2.setFillColorRGB(1, 1, 1)
-c2.rect(0, 0, SPREAD_WIDTH, PAGE_HEIGHT, fill=1)
-
 # Draw end page on left side
 if end_file:
     end_path = os.path.join(pages_dir, end_file)
-    if os.path.exists(end_path):
-        c2.drawImage(end_path, 0, 0, width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    if draw_page_image(c2, end_path):
         print(f"  ✅ Added (left): {end_file}")
     else:
         print(f"  ⚠️ Missing: {end_file}")
 else:
+    draw_blank_page(c2)
     print("  ⚠️ No end page found")
 
 # Draw cover on right side
 if cover_file:
     cover_path = os.path.join(pages_dir, cover_file)
-    if os.path.exists(cover_path):
-        c2.drawImage(cover_path, PAGE_WIDTH, 0, width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    if draw_page_image(c2, cover_path, x=PAGE_WIDTH):
         print(f"  ✅ Added (right): {cover_file}")
     else:
         print(f"  ⚠️ Missing: {cover_file}")
 else:
+    draw_blank_page(c2, x=PAGE_WIDTH)
     print("  ⚠️ No cover page found")
 
 c2.showPage()
@@ -0,0 +1,22 @@
+# file_utils.py
+"""File helpers shared by the book generation scripts."""
+
+import os
+
+
+def atomic_write(path, text):
+    """Write text to path so readers never see a half-written file.
+    
+    The text goes to a temporary file next to path, which then replaces
+    path in a single rename. If the process dies mid-write, the previous
+    file is left intact.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,42 @@
+# gemini_cache.py
+"""
+Disk cache for Gemini responses, keyed by model name and prompt text.
+
+Re-running a step with an unchanged prompt (e.g. after a later step failed)
+reuses the saved response instead of paying for another model call.
+Set KIDSBOOK_NOCACHE=1 to always call the model.
+"""
+
+import hashlib
+import json
+import os
+
+from file_utils import atomic_write
+
+CACHE_DIR = os.path.join(".cache", "gemini")
+NO_CACHE = os.getenv("KIDSBOOK_NOCACHE") == "1"
+
+
+def _cache_path(model, prompt):
+    """Return the cache file for a model/prompt pair."""
+    key = hashlib.sha256(
+        (model.model_name + prompt).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def load_response(model, prompt):
+    """Return the cached response text for prompt, or None on a miss."""
+    if NO_CACHE:
+        return None
+    try:
+        with open(_cache_path(model, prompt), "r", encoding="utf-8") as f:
+            return json.load(f)["text"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_response(model, prompt, text):
+    """Cache a response that was parsed successfully."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    atomic_write(_cache_path(model, prompt), json.dumps({"text": text}))
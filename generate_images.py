@@ -1,22 +1,61 @@
 # generate_images.py
 """Generate children's book illustrations using Pollinations.ai."""
 
+import hashlib
 import json
+import math
+import multiprocessing
 import os
+import queue
+import random
+import sys
+import threading
 import time
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
 from urllib.parse import quote as url_quote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from resize_images import resize_image
+from resize_images import derive_background, resize_image
 from variables import IMAGE_GEN_WIDTH, IMAGE_GEN_HEIGHT
 
 # API configuration
 POLLINATIONS_BASE_URL = "https://image.pollinations.ai/prompt"
 REQUEST_TIMEOUT = 120
+WARMUP_TIMEOUT = 10
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+WRITE_BUFFER_SIZE = 1 << 20
 DEFAULT_MAX_RETRIES = 3
-INTER_REQUEST_DELAY = 2
-POST_GENERATION_DELAY = 3
+
+# Retry backoff: decorrelated jitter, bounded by a per-process time budget
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRY_BUDGET_SECONDS = 600
+
+# Concurrency settings
+MAX_WORKERS = 8
+MAX_CONCURRENT_REQUESTS = 4  # Politeness budget for the free API
+CONNECTION_POOL_SIZE = 16
+ADAPTER_RETRIES = 2
+RESIZE_WORKERS = os.cpu_count() or 1
+
+# Re-run settings: existing images are reused unless FORCE_REGEN=1
+FORCE_REGEN = os.getenv("FORCE_REGEN") == "1"
+MIN_IMAGE_BYTES = 1024
+PROMPT_HASH_SUFFIX = ".prompt.sha256"
+PARTIAL_SUFFIX = ".part"  # In-progress downloads, renamed when complete
+
+# Pipeline settings: with RENDER_PAGES=1 each story page is rendered as soon
+# as both of its images are ready, overlapping rendering with downloads
+RENDER_PAGES = os.getenv("RENDER_PAGES") == "1"
+PAGES_OUTPUT_DIR = "pages"
+
+# Story page backgrounds are derived locally from the main image at this size
+BACKGROUND_SIZE = (IMAGE_GEN_WIDTH, IMAGE_GEN_HEIGHT)
 
 # Image generation settings
 IMAGE_STYLE_SUFFIX = (
@@ -33,6 +72,55 @@ REQUEST_HEADERS = {
 }
 
 
+def _create_session():
+    """Create an HTTP session with a keep-alive pool shared by all workers."""
+    session = requests.Session()
+    session.headers.update(REQUEST_HEADERS)
+    # Connection failures and gateway errors are retried here with a short
+    # backoff; anything else falls through to the jittered retry loop
+    adapter_retry = Retry(
+        total=ADAPTER_RETRIES, connect=ADAPTER_RETRIES, read=0,
+        status=ADAPTER_RETRIES, backoff_factor=1,
+        status_forcelist=(502, 503, 504), raise_on_status=False
+    )
+    # All requests go to one host, so one pool holding many sockets
+    adapter = HTTPAdapter(pool_connections=1,
+                          pool_maxsize=CONNECTION_POOL_SIZE,
+                          max_retries=adapter_retry)
+    session.mount("https://", adapter)
+    return session
+
+
+def warm_up_session():
+    """Resolve DNS and open the first TLS connection before downloads start."""
+    try:
+        SESSION.head(POLLINATIONS_BASE_URL, timeout=WARMUP_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"  ⚠️ Connection warm-up failed: {e}")
+
+
+SESSION = _create_session()
+_request_slots = threading.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+# Downloaded images waiting to be resized, as
+# (filepath, digest, background_path) tuples
+_resize_queue = queue.Queue()
+_resize_workers = []
+
+# No retry may start after this point; failed images stay failed. The
+# budget starts with the downloads (see start_retry_budget), not at
+# import, since generate_story.py imports this module before streaming.
+_retry_deadline = None
+
+# Page rendering pipeline state (only used with RENDER_PAGES=1)
+_render_pool = None
+_render_jobs = []
+_story_pages = {}  # landscape image path -> (page number, page data)
+_ready_images = set()
+_rendered_pages = set()  # story page image paths already queued to render
+_ready_lock = threading.Lock()
+
+
 def get_book_title():
     """Extract the book title from story.json (first page's story field)."""
     with open("story.json", "r", encoding="utf-8") as f:
@@ -42,115 +130,419 @@ def get_book_title():
     return ""
 
 
-def _build_image_url(prompt, width, height):
+def _encode_prompt(prompt):
+    """URL-encode a prompt with the illustration style suffix applied."""
+    return url_quote(prompt + IMAGE_STYLE_SUFFIX)
+
+
+def _build_image_url(encoded_prompt, width, height):
     """Build the Pollinations.ai image generation URL."""
-    encoded_prompt = url_quote(prompt)
     return (f"{POLLINATIONS_BASE_URL}/{encoded_prompt}"
             f"?width={width}&height={height}&nologo=true")
 
 
-def _download_image(url, filepath, orientation, attempt, max_retries):
+def _flush_log(lines):
+    """Write buffered progress lines with a single stdout write.
+    
+    Keeps each worker's messages together instead of interleaving them
+    line by line with other threads.
+    """
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        lines.clear()
+
+
+def _download_image(url, filepath, orientation, attempt, max_retries, log):
     """Download an image from URL and save to filepath.
     
-    Returns True on success, False on failure.
+    The body is streamed to a partial file that only replaces filepath once
+    it has fully arrived, so a failed download never truncates or clobbers
+    an existing image. The image's prompt hash is removed before the swap
+    and only rewritten once it is resized. Progress messages are appended
+    to log. Raises requests.RequestException on failure.
     """
+    log.append(f"    Generating {orientation}... "
+               f"(attempt {attempt}/{max_retries})")
+    partial_path = filepath + PARTIAL_SUFFIX
     try:
-        print(f"    Generating {orientation}... "
-              f"(attempt {attempt}/{max_retries})")
-        response = requests.get(
-            url, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT
-        )
-        response.raise_for_status()
-        
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
-        
-        print(f"  ✅ Saved: {filepath}")
-        resize_image(filepath)
-        return True
-    except requests.RequestException as e:
-        print(f"  ⚠️ Attempt {attempt} failed ({orientation}): {e}")
+        with _request_slots:
+            with SESSION.get(url, timeout=REQUEST_TIMEOUT,
+                             stream=True) as response:
+                response.raise_for_status()
+                with open(partial_path, 'wb',
+                          buffering=WRITE_BUFFER_SIZE) as f:
+                    for chunk in response.iter_content(
+                            chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+        # The old sidecar must go first: if the run stops before the new
+        # image is resized, the next run has to download it again
+        try:
+            os.remove(_prompt_hash_path(filepath))
+        except FileNotFoundError:
+            pass
+        os.replace(partial_path, filepath)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    
+    log.append(f"  ✅ Saved: {filepath}")
+
+
+def _retry_after_seconds(error):
+    """Return the Retry-After delay of a 429 response, or None.
+    
+    Negative or non-finite values are ignored, and the delay is capped at
+    RETRY_MAX_DELAY.
+    """
+    response = getattr(error, "response", None)
+    if response is None or response.status_code != 429:
+        return None
+    try:
+        seconds = float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(seconds) or seconds < 0:
+        return None
+    return min(seconds, RETRY_MAX_DELAY)
+
+
+def _prompt_hash_path(filepath):
+    """Path of the sidecar file recording which request made filepath."""
+    return os.path.splitext(filepath)[0] + PROMPT_HASH_SUFFIX
+
+
+def _is_up_to_date(filepath, digest):
+    """Check if filepath exists and was generated from the same request."""
+    if FORCE_REGEN:
         return False
+    if (not os.path.exists(filepath)
+            or os.path.getsize(filepath) <= MIN_IMAGE_BYTES):
+        return False
+    try:
+        with open(_prompt_hash_path(filepath), "r", encoding="utf-8") as f:
+            return f.read().strip() == digest
+    except OSError:
+        return False
+
+
+def _write_prompt_hash(filepath, digest):
+    """Record the request digest that generated filepath."""
+    with open(_prompt_hash_path(filepath), "w", encoding="utf-8") as f:
+        f.write(digest)
+
+
+def _resize_and_record(filepath, digest, background_path=None):
+    """Derive a downloaded image's background, resize it and mark both ready.
+    
+    The background is derived from the download before it is upscaled, so
+    the small original is decoded instead of the full print-size PNG. The
+    prompt hash is only recorded when every step succeeded, so a broken
+    image is downloaded again on the next run.
+    """
+    background_ok = True
+    if background_path:
+        background_ok = derive_background(filepath, background_path,
+                                          BACKGROUND_SIZE)
+        if background_ok:
+            _image_ready(background_path)
+    if not resize_image(filepath):
+        # An undecodable download would break page rendering, so drop it
+        # and let the page fall back to text only
+        os.remove(filepath)
+        return
+    if background_ok:
+        _write_prompt_hash(filepath, digest)
+    _image_ready(filepath)
+
+
+def _resize_worker():
+    """Resize queued images until a None sentinel is received.
+    
+    A failing job is logged and skipped so the rest of the queue still
+    gets processed.
+    """
+    for job in iter(_resize_queue.get, None):
+        try:
+            _resize_and_record(*job)
+        except Exception as e:
+            print(f"  ❌ Failed to process {job[0]}: {e!r}")
 
 
-def _generate_single_image(prompt, filepath, width, height, orientation,
-                           max_retries):
-    """Generate a single image with retry logic."""
-    url = _build_image_url(prompt + IMAGE_STYLE_SUFFIX, width, height)
+def start_retry_budget(seconds=RETRY_BUDGET_SECONDS):
+    """Stop starting new download retries once seconds have passed from now.
     
+    Call this right before downloads begin. Without it, retries are only
+    limited by each image's max_retries.
+    """
+    global _retry_deadline
+    _retry_deadline = time.monotonic() + seconds
+
+
+def start_resize_workers(count=RESIZE_WORKERS):
+    """Start background threads that resize images as they are downloaded."""
+    for _ in range(count):
+        worker = threading.Thread(target=_resize_worker, daemon=True)
+        worker.start()
+        _resize_workers.append(worker)
+
+
+def stop_resize_workers():
+    """Wait for queued resizes to finish and stop the worker threads."""
+    for _ in _resize_workers:
+        _resize_queue.put(None)
+    for worker in _resize_workers:
+        worker.join()
+    _resize_workers.clear()
+
+
+def _finish_image(filepath, digest, background_path=None):
+    """Resize a downloaded image, in the background if workers are running."""
+    if _resize_workers:
+        _resize_queue.put((filepath, digest, background_path))
+    else:
+        _resize_and_record(filepath, digest, background_path)
+
+
+def start_page_rendering(image_dir):
+    """Start a process pool that renders story pages as their images land."""
+    global _render_pool
+    # generate_page needs numpy and qrcode, so only import it in this mode
+    import generate_page
+    
+    _, story_pages = generate_page.parse_story()
+    for page_num, page_data in enumerate(story_pages, start=1):
+        page_path = f"{image_dir}/page_{page_num:02d}.png"
+        _story_pages[page_path] = (page_num, page_data)
+    os.makedirs(PAGES_OUTPUT_DIR, exist_ok=True)
+    # Spawn rather than fork: the download and resize threads may hold
+    # locks at the moment a worker process is started
+    _render_pool = ProcessPoolExecutor(
+        max_workers=generate_page.RENDER_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _submit_render(generate_func, *args):
+    """Queue a page render on the pipeline's process pool."""
+    import generate_page
+    _render_jobs.append(_render_pool.submit(
+        generate_page.render_job, generate_func, *args
+    ))
+
+
+def _image_ready(filepath):
+    """Render the story page for filepath once both of its images are ready."""
+    if _render_pool is None:
+        return
+    page_path = filepath.replace("_bg.png", ".png")
+    bg_path = page_path.replace(".png", "_bg.png")
+    with _ready_lock:
+        _ready_images.add(filepath)
+        if page_path not in _story_pages:
+            return  # Cover and end pages are rendered by finish_page_rendering
+        if not {page_path, bg_path} <= _ready_images:
+            return
+        import generate_page
+        page_num, page_data = _story_pages[page_path]
+        print(f"  🖌️ Rendering story page {page_num}")
+        _rendered_pages.add(page_path)
+        _submit_render(generate_page.generate_story_page, page_num,
+                       page_data, PAGES_OUTPUT_DIR)
+
+
+def finish_page_rendering(end_page_number):
+    """Render the cover, end and leftover story pages and wait for them all.
+    
+    Story pages whose images failed were never queued by _image_ready, so
+    they are rendered here with whatever images exist (text only if none).
+    """
+    global _render_pool
+    import generate_page
+    try:
+        with _ready_lock:
+            missing = [
+                _story_pages[page_path]
+                for page_path in _story_pages
+                if page_path not in _rendered_pages
+            ]
+            _rendered_pages.update(_story_pages)
+        for page_num, page_data in missing:
+            print(f"  🖌️ Rendering story page {page_num} (missing images)")
+            _submit_render(generate_page.generate_story_page, page_num,
+                           page_data, PAGES_OUTPUT_DIR)
+        _submit_render(generate_page.generate_cover_page, PAGES_OUTPUT_DIR)
+        _submit_render(generate_page.generate_end_page, end_page_number,
+                       PAGES_OUTPUT_DIR)
+        # Surface the first worker error, if any
+        for job in _render_jobs:
+            job.result()
+    finally:
+        _render_pool.shutdown()
+        _render_pool = None
+    print(f"✅ {len(_render_jobs)} pages rendered to {PAGES_OUTPUT_DIR}/")
+
+
+def _generate_single_image(encoded_prompt, filepath, width, height,
+                           orientation, max_retries, background_path=None):
+    """Generate a single image with retry logic.
+    
+    Skips the download when the image on disk was already generated from
+    the same prompt and size. When background_path is given, a page
+    background is derived from the image and saved there.
+    """
+    url = _build_image_url(encoded_prompt, width, height)
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    
+    if _is_up_to_date(filepath, digest):
+        print(f"  ⏭️ Up to date, skipping: {filepath}")
+        if background_path and not os.path.exists(background_path):
+            derive_background(filepath, background_path, BACKGROUND_SIZE)
+        if background_path:
+            _image_ready(background_path)
+        _image_ready(filepath)
+        return True
+    
+    log = []
+    delay = RETRY_BASE_DELAY
     for attempt in range(1, max_retries + 1):
-        if _download_image(url, filepath, orientation, attempt, max_retries):
+        try:
+            _download_image(url, filepath, orientation, attempt, max_retries,
+                            log)
+        except requests.RequestException as e:
+            log.append(f"  ⚠️ Attempt {attempt} failed ({orientation}): {e}")
+            retry_after = _retry_after_seconds(e)
+        else:
+            _flush_log(log)
+            _finish_image(filepath, digest, background_path)
             return True
         
         if attempt < max_retries:
-            wait_time = attempt * 5
-            print(f"    Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
+            if retry_after is not None:
+                # Throttled: wait as long as the server asks, up to the cap
+                delay = retry_after
+            else:
+                delay = min(RETRY_MAX_DELAY,
+                            random.uniform(RETRY_BASE_DELAY, delay * 3))
+            if (_retry_deadline is not None
+                    and time.monotonic() + delay > _retry_deadline):
+                log.append("    Retry budget exhausted, giving up")
+                break
+            log.append(f"    Retrying in {delay:.1f} seconds...")
+            _flush_log(log)
+            time.sleep(delay)
     
-    print(f"  ❌ All {max_retries} attempts failed for {orientation}")
+    log.append(f"  ❌ All {attempt} attempts failed for {orientation}")
+    _flush_log(log)
     return False
 
 
-def generate_image(prompt, filename, max_retries=DEFAULT_MAX_RETRIES):
-    """Generate two images using Pollinations.ai (FREE, no API key needed).
-    
-    Generates:
-    1. Portrait (background) - saved as {filename}_bg.png
-    2. Landscape (main) - saved as {filename}.png
+def _image_jobs(filename, derive_bg=True):
+    """List the images to request for a prompt.
     
-    Both images are resized after saving.
+    Returns (filepath, width, height, orientation, background_path) tuples.
+    Story pages request only the landscape main image ({filename}.png);
+    their portrait background ({filename}_bg.png) is drawn at low opacity,
+    so it is derived from the main image instead of generated. Cover and
+    end pages use only the portrait image ({filename}_bg.png).
     """
     base_filename = filename.replace('.png', '')
+    if derive_bg:
+        return [
+            (f"{base_filename}.png", IMAGE_GEN_HEIGHT, IMAGE_GEN_WIDTH,
+             f"landscape ({IMAGE_GEN_HEIGHT}x{IMAGE_GEN_WIDTH})",
+             f"{base_filename}_bg.png"),
+        ]
+    return [
+        (f"{base_filename}_bg.png", IMAGE_GEN_WIDTH, IMAGE_GEN_HEIGHT,
+         f"portrait ({IMAGE_GEN_WIDTH}x{IMAGE_GEN_HEIGHT})", None),
+    ]
+
+
+def generate_image(prompt, filename, max_retries=DEFAULT_MAX_RETRIES,
+                   derive_bg=True):
+    """Generate images for a prompt using Pollinations.ai (FREE, no API key needed).
     
-    # Generate portrait background image
-    portrait_file = f"{base_filename}_bg.png"
-    _generate_single_image(
-        prompt, portrait_file,
-        IMAGE_GEN_WIDTH, IMAGE_GEN_HEIGHT,
-        f"portrait ({IMAGE_GEN_WIDTH}x{IMAGE_GEN_HEIGHT})",
-        max_retries
-    )
-    
-    time.sleep(INTER_REQUEST_DELAY)
-    
-    # Generate landscape main image
-    landscape_file = f"{base_filename}.png"
-    _generate_single_image(
-        prompt, landscape_file,
-        IMAGE_GEN_HEIGHT, IMAGE_GEN_WIDTH,
-        f"landscape ({IMAGE_GEN_HEIGHT}x{IMAGE_GEN_WIDTH})",
-        max_retries
-    )
-    
-    time.sleep(POST_GENERATION_DELAY)
+    See _image_jobs for which images are requested. Images are resized
+    after saving.
+    """
+    encoded_prompt = _encode_prompt(prompt)
+    for filepath, width, height, orientation, background_path in (
+            _image_jobs(filename, derive_bg)):
+        _generate_single_image(
+            encoded_prompt, filepath, width, height, orientation, max_retries,
+            background_path
+        )
     return True
 
 
-def generate_cover_page(first_prompt, output_dir):
-    """Generate the cover page illustration."""
+def _submit_image(executor, prompt, filename, label, derive_bg=True):
+    """Queue the images for a prompt on executor.
+    
+    Returns a dict mapping each future to its (label, orientation).
+    """
+    encoded_prompt = _encode_prompt(prompt)
+    return {
+        executor.submit(
+            _generate_single_image, encoded_prompt, filepath, width, height,
+            orientation, DEFAULT_MAX_RETRIES, background_path
+        ): (label, orientation)
+        for filepath, width, height, orientation, background_path in (
+            _image_jobs(filename, derive_bg))
+    }
+
+
+def generate_cover_page(first_prompt, output_dir, executor):
+    """Queue the cover page illustration."""
     cover_prompt = first_prompt + COVER_STYLE_SUFFIX
-    generate_image(cover_prompt, f"{output_dir}/page_00_cover.png")
+    return _submit_image(
+        executor, cover_prompt, f"{output_dir}/page_00_cover.png", "cover",
+        derive_bg=False
+    )
 
 
-def generate_story_pages(prompts, output_dir, total_images):
-    """Generate illustrations for all story pages."""
+def generate_story_pages(prompts, output_dir, total_images, executor):
+    """Queue illustrations for all story pages."""
+    futures = {}
     for i, prompt in enumerate(prompts):
         page_num = i + 1
         progress = i + 2  # +1 for cover, +1 for 1-based index
-        print(f"Generating story page {page_num} ({progress}/{total_images}): "
+        print(f"Queueing story page {page_num} ({progress}/{total_images}): "
               f"{prompt[:50]}...")
-        generate_image(prompt, f"{output_dir}/page_{page_num:02d}.png")
+        futures.update(_submit_image(
+            executor, prompt, f"{output_dir}/page_{page_num:02d}.png",
+            f"page {page_num}"
+        ))
+    return futures
 
 
-def generate_end_page(page_number, output_dir, total_images):
-    """Generate the end/thank you page illustration."""
-    print(f"Generating end page ({total_images}/{total_images}): Thank You...")
+def generate_end_page(page_number, output_dir, total_images, executor):
+    """Queue the end/thank you page illustration."""
+    print(f"Queueing end page ({total_images}/{total_images}): Thank You...")
     end_prompt = (
         "A colorful and cheerful illustration of a group of children "
         "holding hands and smiling in a sunny park, with balloons and "
         "flowers around them, celebrating friendship and happiness"
     )
-    generate_image(end_prompt, f"{output_dir}/page_{page_number:02d}_end.png")
+    return _submit_image(
+        executor, end_prompt, f"{output_dir}/page_{page_number:02d}_end.png",
+        "end", derive_bg=False
+    )
+
+
+def _wait_for_images(futures):
+    """Wait for all queued image jobs and return the failed (label, orientation)s.
+    
+    Every job that finished since the last wakeup is reaped as one batch.
+    """
+    failed = []
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        failed.extend(futures[f] for f in done if not f.result())
+        finished = len(futures) - len(pending)
+        sys.stdout.write(f"  📦 Images finished: {finished}/{len(futures)}\n")
+    return failed
 
 
 def main():
@@ -169,20 +561,41 @@ def main():
     print(f"Book Title: {book_title}")
     print("=" * 60)
     
-    # Generate cover page
     if not prompts:
         raise ValueError("No image prompts found.")
     first_prompt = prompts[0]
-    generate_cover_page(first_prompt, output_dir)
     
-    # Generate story pages
-    generate_story_pages(prompts, output_dir, total_images)
+    warm_up_session()
+    
+    if RENDER_PAGES:
+        start_page_rendering(output_dir)
     
-    # Generate end page
-    end_page_number = len(prompts) + 1
-    generate_end_page(end_page_number, output_dir, total_images)
+    # Resize downloaded images in the background while downloads continue
+    start_retry_budget()
+    start_resize_workers()
+    try:
+        # Every portrait/landscape image of the book is its own job; the
+        # number of in-flight HTTP requests is bounded by _request_slots
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = generate_cover_page(first_prompt, output_dir, executor)
+            futures.update(generate_story_pages(
+                prompts, output_dir, total_images, executor
+            ))
+            end_page_number = len(prompts) + 1
+            futures.update(generate_end_page(
+                end_page_number, output_dir, total_images, executor
+            ))
+            failed = _wait_for_images(futures)
+    finally:
+        stop_resize_workers()
+    
+    if failed:
+        print(f"  ⚠️ {len(failed)} images failed: {failed}")
     
     print("\n✅ Image generation complete!")
+    
+    if RENDER_PAGES:
+        finish_page_rendering(end_page_number)
 
 
 if __name__ == "__main__":
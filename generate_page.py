@@ -9,22 +9,27 @@ import math
 import numpy as np
 import random
 import qrcode
-from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from variables import (
-    PAGE_WIDTH as _PAGE_WIDTH, PAGE_HEIGHT as _PAGE_HEIGHT, 
+    PAGE_WIDTH, PAGE_HEIGHT,
     BG_OPACITY_CENTER, BG_OPACITY_EDGE,
     FONT_SIZE, LINE_SPACING, TEXT_MARGIN, ETSY_SHOP_URL
 )
 
-# Convert to integers for PIL compatibility
-PAGE_WIDTH = int(_PAGE_WIDTH)
-PAGE_HEIGHT = int(_PAGE_HEIGHT)
-
 # Layout constants
 HALF_HEIGHT = PAGE_HEIGHT // 2
 WAVE_HEIGHT = 25
 DEFAULT_WAVE_COUNT = 8
 EDGE_TYPES = ["wave", "scallop", "zigzag"]
+TEXT_MAX_WIDTH = PAGE_WIDTH - (2 * TEXT_MARGIN)
+STORY_LINE_HEIGHT = int(FONT_SIZE * LINE_SPACING)
+
+# PNG zlib level for rendered pages (1 = fastest)
+PAGE_PNG_COMPRESS_LEVEL = 1
+
+# Number of worker processes used to render pages in parallel
+RENDER_WORKERS = os.cpu_count() or 1
 
 # Color extraction settings
 COLOR_QUANTIZE_LEVELS = 8
@@ -32,53 +37,129 @@ MIN_BRIGHTNESS = 60
 MIN_SATURATION = 0.25
 DEFAULT_LIGHT_COLOR = (255, 250, 245)
 DEFAULT_DARK_COLOR = (0, 0, 0)
+COLOR_SAMPLE_SIZE = (100, 100)
+# The sample only feeds a color histogram, so plain box averaging is enough
+COLOR_SAMPLE_RESAMPLE = Image.Resampling.BOX
+REDUCING_GAP = 3.0  # Box-reduce large images before the final resample
+# The background is blurred and drawn at low opacity, so a cheap 2-tap
+# filter is indistinguishable from LANCZOS there
+BACKGROUND_RESAMPLE = Image.Resampling.BILINEAR
 
+# Per-band lookup table that snaps each channel down to its quantize level
+_QUANTIZE_LUT = [
+    (value // COLOR_QUANTIZE_LEVELS) * COLOR_QUANTIZE_LEVELS
+    for value in range(256)
+] * 3
 
-def _extract_quantized_colors(image_path, num_colors=50):
-    """Extract and quantize colors from an image.
+
+def _most_common_quantized(img, num_colors):
+    """Quantize an RGB image and return its most common colors.
     
-    Returns scored vibrant colors.
+    Returns a (K, 3) array of colors in the same order as
+    Counter(quantized_pixels).most_common(num_colors), counted with NumPy
+    on packed 24-bit color codes.
     """
-    img = Image.open(image_path).convert('RGB')
-    img = img.resize((100, 100), Image.Resampling.LANCZOS)
-    
-    # Quantize pixels to reduce unique colors
-    pixels = list(img.getdata())
-    quantized = [
-        ((r // COLOR_QUANTIZE_LEVELS) * COLOR_QUANTIZE_LEVELS,
-         (g // COLOR_QUANTIZE_LEVELS) * COLOR_QUANTIZE_LEVELS,
-         (b // COLOR_QUANTIZE_LEVELS) * COLOR_QUANTIZE_LEVELS)
-        for r, g, b in pixels
-    ]
+    quantized = np.asarray(img.point(_QUANTIZE_LUT))
+    quantized = quantized.reshape(-1, 3).astype(np.int64)
+    codes = (quantized[:, 0] << 16) | (quantized[:, 1] << 8) | quantized[:, 2]
     
-    color_counts = Counter(quantized)
-    most_common = color_counts.most_common(num_colors)
+    unique, first_index, counts = np.unique(
+        codes, return_index=True, return_counts=True
+    )
+    if counts.size > num_colors:
+        # Keep only colors at least as common as the num_colors-th one
+        # (an O(n) partition) so the ordering sort stays small. Ties at
+        # the cutoff are all kept so the ordering below can break them.
+        cutoff = np.partition(counts, counts.size - num_colors)[
+            counts.size - num_colors
+        ]
+        keep = counts >= cutoff
+        unique, first_index, counts = (
+            unique[keep], first_index[keep], counts[keep]
+        )
     
-    # Score colors by vibrancy (saturation + brightness)
-    valid_colors = []
-    for color, count in most_common:
-        r, g, b = color
-        max_c, min_c = max(r, g, b), min(r, g, b)
-        
-        if max_c < MIN_BRIGHTNESS:
-            continue
-        
-        saturation = (max_c - min_c) / max_c if max_c > 0 else 0
-        if saturation < MIN_SATURATION:
-            continue
-        
-        score = (saturation * 300) + max_c
-        valid_colors.append((color, score))
+    # Most frequent first; ties keep first-seen order like Counter
+    order = np.lexsort((first_index, -counts))[:num_colors]
+    codes = unique[order]
+    return np.stack([codes >> 16, (codes >> 8) & 0xFF, codes & 0xFF], axis=1)
+
+
+def _score_vibrant_colors(colors):
+    """Score colors by vibrancy (saturation + brightness), best first.
     
-    # Fallback: use brightest colors if no saturated ones found
-    if not valid_colors:
-        for color, count in most_common:
-            max_c = max(color)
-            if max_c > 50:
-                valid_colors.append((color, max_c))
+    colors is a (K, 3) array in most-common-first order, which is kept
+    for colors with equal scores. Returns ((r, g, b), score) tuples.
+    """
+    max_c = colors.max(axis=1)
+    min_c = colors.min(axis=1)
+    saturation = (max_c - min_c) / np.maximum(max_c, 1)
+    valid = (max_c >= MIN_BRIGHTNESS) & (saturation >= MIN_SATURATION)
+    if valid.any():
+        scores = saturation[valid] * 300 + max_c[valid]
+        colors = colors[valid]
+    else:
+        # Fallback: use brightest colors if no saturated ones found
+        bright = max_c > 50
+        scores = max_c[bright]
+        colors = colors[bright]
+    
+    order = np.argsort(-scores, kind='stable')
+    return tuple(
+        (tuple(colors[i].tolist()), scores[i].item()) for i in order
+    )
+
+
+def _open_rgb(image_path):
+    """Open an image in RGB mode, reusing recent decodes of the same file.
     
-    valid_colors.sort(key=lambda x: x[1], reverse=True)
-    return valid_colors
+    A story page's main image is read by the color helpers and again by
+    the compositor, so it is decoded once. Callers must not modify the
+    returned image.
+    """
+    return _decoded_rgb(image_path, os.path.getmtime(image_path))
+
+
+@lru_cache(maxsize=2)
+def _decoded_rgb(image_path, mtime):
+    """Decode an image in RGB mode (cached by path and mtime)."""
+    img = Image.open(image_path)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.load()
+    return img
+
+
+def _extract_quantized_colors(image_path, num_colors=50, top_fraction=0,
+                              bottom_fraction=1):
+    """Extract and quantize colors from an image.
+    
+    Returns scored vibrant colors. Results are cached per file version,
+    so the several color helpers run on one image decode it only once.
+    
+    Args:
+        image_path: Path to the image
+        num_colors: Number of most common colors to score
+        top_fraction: Start of region (0-1, from top)
+        bottom_fraction: End of region (0-1, from top)
+    """
+    mtime = os.path.getmtime(image_path)
+    return _scored_colors(image_path, mtime, num_colors, top_fraction,
+                          bottom_fraction)
+
+
+@lru_cache(maxsize=256)
+def _scored_colors(image_path, mtime, num_colors, top_fraction,
+                   bottom_fraction):
+    """Score the vibrant colors of an image (cached by path and mtime)."""
+    img = _decoded_rgb(image_path, mtime)
+    if top_fraction != 0 or bottom_fraction != 1:
+        # Crop to the specified vertical region
+        width, height = img.size
+        img = img.crop((0, int(height * top_fraction),
+                        width, int(height * bottom_fraction)))
+    img = img.resize(COLOR_SAMPLE_SIZE, COLOR_SAMPLE_RESAMPLE,
+                     reducing_gap=REDUCING_GAP)
+    return _score_vibrant_colors(_most_common_quantized(img, num_colors))
 
 
 def get_dominant_color(image_path, num_colors=50):
@@ -143,99 +224,67 @@ def get_brightest_color(image_path, num_colors=50):
         return (255, 255, 255)
 
 
-def _draw_wave_edge(draw, width, height, wave_height, wave_count,
-                    at_top=False):
-    """Draw a sine wave edge pattern on a mask."""
-    for x in range(width):
-        progress = x / width * wave_count * 2 * math.pi
-        y_offset = math.sin(progress) * wave_height
-        if at_top:
-            wave_y = int(wave_height - y_offset)
-            draw.line([(x, 0), (x, wave_y)], fill=0)
-        else:
-            wave_y = int(height - wave_height + y_offset)
-            draw.line([(x, wave_y), (x, height)], fill=0)
+def _wave_edge_boundary(width, height, wave_height, wave_count,
+                        at_top=False):
+    """Return the per-column boundary row of a sine wave edge."""
+    x = np.arange(width)
+    y_offset = np.sin(x / width * wave_count * 2 * math.pi) * wave_height
+    if at_top:
+        return (wave_height - y_offset).astype(np.int64)
+    return (height - wave_height + y_offset).astype(np.int64)
 
 
-def _draw_scallop_edge(draw, width, height, wave_height, wave_count,
-                       at_top=False):
-    """Draw a scallop/cloud edge pattern on a mask."""
+def _scallop_edge_boundary(width, height, wave_height, wave_count,
+                           at_top=False):
+    """Return the per-column boundary row of a scallop/cloud edge."""
     scallop_width = width // wave_count
     scallop_radius = scallop_width // 2
     
-    if not at_top:
-        # Draw scallops at bottom
-        draw.rectangle([0, 0, width, height - scallop_radius], fill=255)
-        for i in range(wave_count + 1):
-            center_x = i * scallop_width
-            center_y = height - scallop_radius - 10
-            bbox = [
-                center_x - scallop_radius, center_y,
-                center_x + scallop_radius, center_y + scallop_radius * 2
-            ]
-            draw.ellipse(bbox, fill=255)
-    
-    # Clear outside scallops
-    for x in range(width):
-        scallop_index = x // scallop_width
-        center_x = scallop_index * scallop_width + scallop_radius
-        if at_top:
-            center_y = scallop_radius + 10
-        else:
-            center_y = height - scallop_radius - 10
-        
-        dx = abs(x - center_x)
-        if dx < scallop_radius:
-            arc_offset = int(math.sqrt(scallop_radius**2 - dx**2))
-            if at_top:
-                arc_y = center_y - arc_offset
-            else:
-                arc_y = center_y + arc_offset
-        else:
-            arc_y = center_y
-        
-        if at_top:
-            draw.line([(x, 0), (x, arc_y)], fill=0)
-        else:
-            draw.line([(x, arc_y), (x, height)], fill=0)
+    x = np.arange(width)
+    center_x = (x // scallop_width) * scallop_width + scallop_radius
+    if at_top:
+        center_y = scallop_radius + 10
+    else:
+        center_y = height - scallop_radius - 10
+    
+    dx = np.abs(x - center_x)
+    inside = dx < scallop_radius
+    arc_offset = np.zeros(width, dtype=np.int64)
+    arc_offset[inside] = np.sqrt(
+        scallop_radius**2 - dx[inside]**2
+    ).astype(np.int64)
+    
+    if at_top:
+        return center_y - arc_offset
+    return center_y + arc_offset
 
 
-def _draw_zigzag_edge(draw, width, height, wave_height, wave_count,
-                      at_top=False):
-    """Draw a zigzag edge pattern on a mask."""
+def _zigzag_edge_boundary(width, height, wave_height, wave_count,
+                          at_top=False):
+    """Return the per-column boundary row of a zigzag edge."""
     tooth_width = width // (wave_count * 2)
     
-    if not at_top:
-        # Draw zigzag polygon at bottom
-        points = [(0, 0), (0, height - wave_height)]
-        for i in range(wave_count * 2 + 1):
-            x = i * tooth_width
-            y = height - wave_height if i % 2 == 0 else height
-            points.append((x, y))
-        points.extend([(width, height - wave_height), (width, 0)])
-        draw.polygon(points, fill=255)
-    
-    # Clear outside zigzag
-    for i in range(wave_count * 2):
-        x1, x2 = i * tooth_width, (i + 1) * tooth_width
-        if at_top:
-            if i % 2 == 0:
-                y1, y2 = wave_height, 0
-            else:
-                y1, y2 = 0, wave_height
-        else:
-            if i % 2 == 0:
-                y1, y2 = height - wave_height, height
-            else:
-                y1, y2 = height, height - wave_height
-        
-        for x in range(x1, min(x2, width)):
-            progress = (x - x1) / tooth_width if tooth_width > 0 else 0
-            y = int(y1 + (y2 - y1) * progress)
-            if at_top:
-                draw.line([(x, 0), (x, y)], fill=0)
-            else:
-                draw.line([(x, y), (x, height)], fill=0)
+    # Columns past the last full tooth keep the whole image
+    boundary = np.full(width, -1 if at_top else height, dtype=np.int64)
+    if tooth_width == 0:
+        return boundary
+    
+    teeth_end = min(wave_count * 2 * tooth_width, width)
+    x = np.arange(teeth_end)
+    tooth = x // tooth_width
+    progress = (x - tooth * tooth_width) / tooth_width
+    
+    # Even teeth slope away from the image edge, odd teeth slope back
+    rising = tooth % 2 == 0
+    if at_top:
+        y1 = np.where(rising, wave_height, 0)
+        y2 = np.where(rising, 0, wave_height)
+    else:
+        y1 = np.where(rising, height - wave_height, height)
+        y2 = np.where(rising, height, height - wave_height)
+    
+    boundary[:teeth_end] = (y1 + (y2 - y1) * progress).astype(np.int64)
+    return boundary
 
 
 def create_decorative_mask(width, height, edge_type="wave", at_top=False):
@@ -247,45 +296,73 @@ def create_decorative_mask(width, height, edge_type="wave", at_top=False):
         edge_type: 'wave', 'scallop', or 'zigzag'
         at_top: If True, decorative edge is at top; otherwise at bottom
     """
-    mask = Image.new('L', (width, height), 255)
-    draw = ImageDraw.Draw(mask)
-    
     wave_count = random.randint(2, 10) if not at_top else DEFAULT_WAVE_COUNT
-    
+    return _build_decorative_mask(width, height, edge_type, at_top, wave_count)
+
+
+@lru_cache(maxsize=64)
+def _build_decorative_mask(width, height, edge_type, at_top, wave_count):
+    """Rasterize a decorative edge mask (cached; callers must not mutate it)."""
     edge_functions = {
-        "wave": _draw_wave_edge,
-        "scallop": _draw_scallop_edge,
-        "zigzag": _draw_zigzag_edge
+        "wave": _wave_edge_boundary,
+        "scallop": _scallop_edge_boundary,
+        "zigzag": _zigzag_edge_boundary
     }
     
-    draw_func = edge_functions.get(edge_type, _draw_wave_edge)
-    draw_func(draw, width, height, WAVE_HEIGHT, wave_count, at_top)
+    boundary_func = edge_functions.get(edge_type, _wave_edge_boundary)
+    boundary = boundary_func(width, height, WAVE_HEIGHT, wave_count, at_top)
+    
+    # Clear everything between the boundary and the decorated edge. Rows
+    # outside the boundary's range are uniformly kept or cleared, so only
+    # the band it spans needs a per-pixel comparison.
+    mask = np.full((height, width), 255, dtype=np.uint8)
+    band_top = max(int(boundary.min()), 0)
+    band_bottom = min(int(boundary.max()) + 1, height)
+    if at_top:
+        mask[:band_top] = 0
+    else:
+        mask[band_bottom:] = 0
     
-    return mask
+    if band_top < band_bottom:
+        rows = np.arange(band_top, band_bottom)[:, None]
+        if at_top:
+            cleared = rows <= boundary
+        else:
+            cleared = rows >= boundary
+        mask[band_top:band_bottom][cleared] = 0
+    
+    return Image.fromarray(mask)
 
 
+@lru_cache(maxsize=4)
 def create_radial_gradient_mask(width, height, center_opacity, edge_opacity):
-    """Create a radial gradient mask from center to edges."""
-    # Create coordinate grids
-    y, x = np.ogrid[:height, :width]
+    """Create a radial gradient mask from center to edges.
     
-    # Calculate center
+    Every story page uses the same gradient, so masks are cached; callers
+    must not modify the returned image.
+    """
     center_x, center_y = width / 2, height / 2
     
-    # Calculate distance from center (normalized to 0-1)
-    max_dist = math.sqrt(center_x**2 + center_y**2)
-    dist = np.sqrt((x - center_x)**2 + (y - center_y)**2) / max_dist
-    
-    # Clamp distance to 0-1 range
-    dist = np.clip(dist, 0, 1)
-    
-    # Interpolate opacity from center to edge
-    opacity = center_opacity + (edge_opacity - center_opacity) * dist
-    
-    # Convert to 0-255 alpha values
-    alpha = (opacity * 255).astype(np.uint8)
-    
-    return Image.fromarray(alpha, mode='L')
+    # Distance from center, normalized so the corners are at 1. Computed in
+    # float32 on broadcast row/column offsets to halve memory traffic, and
+    # updated in place so only one full-page array is allocated.
+    inv_max_dist = np.float32(1 / math.sqrt(center_x**2 + center_y**2))
+    dx = np.arange(width, dtype=np.float32) - np.float32(center_x)
+    dy = np.arange(height, dtype=np.float32)[:, None] - np.float32(center_y)
+    alpha = dx * dx + dy * dy
+    np.sqrt(alpha, out=alpha)
+    alpha *= inv_max_dist
+    
+    # Interpolate opacity from center to edge and convert to 0-255 alpha
+    # (distances never exceed 1, so no clipping is needed)
+    alpha *= np.float32((edge_opacity - center_opacity) * 255)
+    alpha += np.float32(center_opacity * 255)
+    
+    return Image.fromarray(alpha.astype(np.uint8))
+
+
+# "Title: ..." header written by generate_prompt.py at the top of prompt.txt
+_TITLE_RE = re.compile(r"Title:\s*(.+)")
 
 
 def parse_story():
@@ -312,7 +389,7 @@ def _extract_title(story_data):
     if os.path.exists("prompt.txt"):
         with open("prompt.txt", "r", encoding="utf-8") as f:
             content = f.read()
-            title_match = re.match(r"Title:\s*(.+)", content)
+            title_match = _TITLE_RE.match(content)
             if title_match:
                 title = title_match.group(1).strip()
     
@@ -331,27 +408,38 @@ def create_page_with_background(bg_image_path, main_image_path=None):
     
     Center has BG_OPACITY_CENTER opacity, edges have BG_OPACITY_EDGE opacity.
     Background color is a light shade of the dominant color from main image.
+    Layers are pasted through masks, so the page stays in RGB mode.
     """
     if main_image_path and os.path.exists(main_image_path):
         bg_color = get_light_color(main_image_path)
     else:
         bg_color = DEFAULT_LIGHT_COLOR
-    page = Image.new('RGB', (PAGE_WIDTH, PAGE_HEIGHT), bg_color)
     
-    if os.path.exists(bg_image_path):
-        bg_img = Image.open(bg_image_path).convert('RGBA')
+    if not os.path.exists(bg_image_path):
+        return Image.new('RGB', (PAGE_WIDTH, PAGE_HEIGHT), bg_color)
+    
+    bg_img = Image.open(bg_image_path).convert('RGB')
+    # Story backgrounds are generated below page resolution. The gradient
+    # is smooth, so blend at the background's own size and upscale the
+    # result once instead of blending every page pixel.
+    if bg_img.width < PAGE_WIDTH and bg_img.height < PAGE_HEIGHT:
+        blend_size = bg_img.size
+    else:
+        blend_size = (PAGE_WIDTH, PAGE_HEIGHT)
         bg_img = bg_img.resize(
-            (PAGE_WIDTH, PAGE_HEIGHT), Image.Resampling.LANCZOS
-        )
-        
-        gradient_mask = create_radial_gradient_mask(
-            PAGE_WIDTH, PAGE_HEIGHT, BG_OPACITY_CENTER, BG_OPACITY_EDGE
+            blend_size, BACKGROUND_RESAMPLE, reducing_gap=REDUCING_GAP
         )
-        bg_img.putalpha(gradient_mask)
-        
-        page = Image.new('RGBA', (PAGE_WIDTH, PAGE_HEIGHT), bg_color)
-        page = Image.alpha_composite(page, bg_img)
-        page = page.convert('RGB')
+    
+    page = Image.new('RGB', blend_size, bg_color)
+    gradient_mask = create_radial_gradient_mask(
+        *blend_size, BG_OPACITY_CENTER, BG_OPACITY_EDGE
+    )
+    # Blend in one pass, using the gradient as the paste mask instead
+    # of attaching it as an alpha channel and compositing
+    page.paste(bg_img, (0, 0), gradient_mask)
+    
+    if blend_size != (PAGE_WIDTH, PAGE_HEIGHT):
+        page = page.resize((PAGE_WIDTH, PAGE_HEIGHT), BACKGROUND_RESAMPLE)
     
     return page
 
@@ -370,37 +458,107 @@ FONT_PATHS = {
 }
 
 
+@lru_cache(maxsize=None)
+def _resolve_font_path(font_type):
+    """Return the first installed font file for font_type, or None."""
+    for font_path in FONT_PATHS.get(font_type, FONT_PATHS["story"]):
+        if os.path.exists(font_path):
+            return font_path
+    return None
+
+
+@lru_cache(maxsize=16)
 def get_font(size=FONT_SIZE, font_type="story"):
     """Get a font for the book.
     
+    Fonts are cached per (size, font_type), so each TTF is parsed once,
+    and the font files are looked up once per font_type.
+    
     Args:
         size: Font size in pixels
         font_type: 'story' for story text, 'title' for titles
     """
+    font_path = _resolve_font_path(font_type)
     try:
-        for font_path in FONT_PATHS.get(font_type, FONT_PATHS["story"]):
-            if os.path.exists(font_path):
-                return ImageFont.truetype(font_path, size)
+        if font_path:
+            return ImageFont.truetype(font_path, size)
     except Exception:
         pass
     return ImageFont.load_default()
 
 
+@lru_cache(maxsize=4096)
+def _word_width(font, word):
+    """Return the advance width of word (cached per font, since story
+    pages repeat many of the same words)."""
+    return font.getlength(word)
+
+
+@lru_cache(maxsize=4096)
+def _word_overhang(font, word):
+    """Return how far word's ink reaches (left, right) past its advance."""
+    left, _, right, _ = font.getbbox(word)
+    return max(0, -left), max(0, right - _word_width(font, word))
+
+
+@lru_cache(maxsize=1024)
+def _space_kerning(font, char):
+    """Return the total kerning between char and a space on either side."""
+    space_width = _word_width(font, ' ')
+    char_width = _word_width(font, char)
+    return (abs(font.getlength(char + ' ') - char_width - space_width)
+            + abs(font.getlength(' ' + char) - char_width - space_width))
+
+
 def wrap_text(text, font, max_width, draw):
-    """Wrap text to fit within max_width."""
+    """Wrap text to fit within max_width.
+    
+    Line widths are estimated by summing cached per-word advance widths.
+    The ink of a line can only extend past its advance by the largest word
+    overhang (plus any kerning against the joining spaces), so a line whose
+    estimate stays below max_width by that margin always fits. Every other
+    candidate line is measured exactly with draw.textbbox, which gives the
+    same breaks as measuring every line.
+    """
     words = text.split()
     lines = []
     current_line = []
+    line_width = 0
+    line_kerning = 0
+    space_width = _word_width(font, ' ')
+    # 1px covers the rounding of textbbox to whole pixels
+    overhangs = [_word_overhang(font, word) for word in words]
+    margin = (max((left for left, _ in overhangs), default=0)
+              + max((right for _, right in overhangs), default=0) + 1)
     
     for word in words:
-        test_line = ' '.join(current_line + [word])
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        if bbox[2] - bbox[0] <= max_width:
+        word_width = _word_width(font, word)
+        if current_line:
+            test_width = line_width + space_width + word_width
+            test_kerning = (line_kerning
+                            + _space_kerning(font, current_line[-1][-1])
+                            + _space_kerning(font, word[0]))
+        else:
+            test_width = word_width
+            test_kerning = 0
+        
+        if test_width + test_kerning + margin > max_width:
+            test_line = ' '.join(current_line + [word])
+            bbox = draw.textbbox((0, 0), test_line, font=font)
+            fits = bbox[2] - bbox[0] <= max_width
+        else:
+            fits = True
+        
+        if fits:
             current_line.append(word)
+            line_width = test_width
+            line_kerning = test_kerning
         else:
             if current_line:
                 lines.append(' '.join(current_line))
             current_line = [word]
+            line_width = word_width
+            line_kerning = 0
     
     if current_line:
         lines.append(' '.join(current_line))
@@ -408,6 +566,19 @@ def wrap_text(text, font, max_width, draw):
     return lines
 
 
+def _render_text_mask(text, font, bbox):
+    """Rasterize text once into an L mask covering bbox.
+    
+    bbox is draw.textbbox((0, 0), text, font=font); stamp the mask at
+    (x + bbox[0], y + bbox[1]) with draw.bitmap to draw text at (x, y).
+    """
+    size = (max(bbox[2] - bbox[0], 1), max(bbox[3] - bbox[1], 1))
+    mask = Image.new('L', size, 0)
+    ImageDraw.Draw(mask).text((-bbox[0], -bbox[1]), text, font=font,
+                              fill=255)
+    return mask
+
+
 def draw_centered_text(draw, text, font, area_top, area_height,
                        text_color=(0, 0, 0), shadow_offset=1):
     """Draw text centered horizontally and vertically in the given area.
@@ -421,13 +592,13 @@ def draw_centered_text(draw, text, font, area_top, area_height,
         text_color: RGB tuple for text color
         shadow_offset: Offset for shadow effect (default 2 pixels)
     """
-    max_width = PAGE_WIDTH - (2 * TEXT_MARGIN)
+    max_width = TEXT_MAX_WIDTH
     
     # Wrap text to fit width
     lines = wrap_text(text, font, max_width, draw)
     
     # Calculate total text height
-    line_height = int(FONT_SIZE * LINE_SPACING)
+    line_height = STORY_LINE_HEIGHT
     total_text_height = len(lines) * line_height
     
     # Calculate starting Y position to center vertically
@@ -447,11 +618,16 @@ def draw_centered_text(draw, text, font, area_top, area_height,
         x = (PAGE_WIDTH - text_width) // 2
         y = start_y + (i * line_height)
         
+        # Rasterize the line once and stamp it for the shadow and the text
+        line_mask = _render_text_mask(line, font, bbox)
+        mask_x, mask_y = x + bbox[0], y + bbox[1]
+        
         # Draw shadow first (offset down and right)
-        draw.text((x + shadow_offset, y + shadow_offset), line, font=font, fill=shadow_color)
+        draw.bitmap((mask_x + shadow_offset, mask_y + shadow_offset),
+                    line_mask, fill=shadow_color)
         
         # Draw main text on top
-        draw.text((x, y), line, font=font, fill=text_color)
+        draw.bitmap((mask_x, mask_y), line_mask, fill=text_color)
 
 
 # Page number settings
@@ -487,14 +663,26 @@ def draw_page_number(draw, page_number, position,
 def _resize_and_crop_image(img, target_width, target_height):
     """Resize image to cover target area and center crop."""
     img_width, img_height = img.size
+    if (img_width, img_height) == (target_width, target_height):
+        return img
+    
     scale = max(target_width / img_width, target_height / img_height)
     new_width, new_height = int(img_width * scale), int(img_height * scale)
     
-    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-    
     left = (new_width - target_width) // 2
     top = (new_height - target_height) // 2
-    return img.crop((left, top, left + target_width, top + target_height))
+    
+    # Resample only the source region that survives the crop, mapped back
+    # through the same per-axis scale the full resize would use. When
+    # int() rounds a side one pixel short, the box is clamped to the
+    # source instead of padding the crop with a black edge.
+    scale_x = img_width / new_width
+    scale_y = img_height / new_height
+    box = (max(left * scale_x, 0), max(top * scale_y, 0),
+           min((left + target_width) * scale_x, img_width),
+           min((top + target_height) * scale_y, img_height))
+    return img.resize((target_width, target_height), Image.Resampling.LANCZOS,
+                      box=box, reducing_gap=REDUCING_GAP)
 
 
 def create_story_page_with_image_and_text(page_number, bg_image_path, main_image_path, text):
@@ -513,20 +701,17 @@ def create_story_page_with_image_and_text(page_number, bg_image_path, main_image
     text_color = get_dominant_color(main_image_path)
     
     if os.path.exists(main_image_path):
-        main_img = Image.open(main_image_path).convert('RGBA')
+        main_img = _open_rgb(main_image_path)
         main_img = _resize_and_crop_image(main_img, PAGE_WIDTH, HALF_HEIGHT)
         
         # Apply decorative mask
         decorative_mask = create_decorative_mask(
             PAGE_WIDTH, HALF_HEIGHT, edge_type=edge_type, at_top=not is_odd_page
         )
-        main_img.putalpha(decorative_mask)
         
-        # Composite image onto page
-        page = page.convert('RGBA')
+        # Paste image onto page through the mask (no RGBA round trip)
         image_y = 0 if is_odd_page else HALF_HEIGHT
-        page.alpha_composite(main_img, (0, image_y))
-        page = page.convert('RGB')
+        page.paste(main_img, (0, image_y), decorative_mask)
     
     # Draw text and page number
     draw = ImageDraw.Draw(page)
@@ -549,61 +734,6 @@ COVER_TITLE_3D_DEPTH = 15  # Number of shadow layers for 3D effect
 COVER_TITLE_LINE_HEIGHT = 1.1  # Tighter line spacing for title
 
 
-def _extract_colors_from_region(image_path, top_fraction=0, bottom_fraction=1):
-    """Extract colors from a specific vertical region of the image.
-    
-    Args:
-        image_path: Path to the image
-        top_fraction: Start of region (0-1, from top)
-        bottom_fraction: End of region (0-1, from top)
-    """
-    try:
-        img = Image.open(image_path).convert('RGB')
-        width, height = img.size
-        
-        # Crop to the specified region
-        top = int(height * top_fraction)
-        bottom = int(height * bottom_fraction)
-        region = img.crop((0, top, width, bottom))
-        region = region.resize((100, 100), Image.Resampling.LANCZOS)
-        
-        # Quantize pixels
-        pixels = list(region.getdata())
-        quantized = [
-            ((r // COLOR_QUANTIZE_LEVELS) * COLOR_QUANTIZE_LEVELS,
-             (g // COLOR_QUANTIZE_LEVELS) * COLOR_QUANTIZE_LEVELS,
-             (b // COLOR_QUANTIZE_LEVELS) * COLOR_QUANTIZE_LEVELS)
-            for r, g, b in pixels
-        ]
-        
-        color_counts = Counter(quantized)
-        most_common = color_counts.most_common(50)
-        
-        # Score colors by vibrancy
-        valid_colors = []
-        for color, count in most_common:
-            r, g, b = color
-            max_c, min_c = max(r, g, b), min(r, g, b)
-            if max_c < MIN_BRIGHTNESS:
-                continue
-            saturation = (max_c - min_c) / max_c if max_c > 0 else 0
-            if saturation < MIN_SATURATION:
-                continue
-            score = (saturation * 300) + max_c
-            valid_colors.append((color, score))
-        
-        if not valid_colors:
-            for color, count in most_common:
-                max_c = max(color)
-                if max_c > 50:
-                    valid_colors.append((color, max_c))
-        
-        valid_colors.sort(key=lambda x: x[1], reverse=True)
-        return valid_colors
-    except Exception:
-        return []
-
-
 def draw_cover_title(draw, title, font, title_area_height, image_path):
     """Draw the book title on the cover with shadow and outline.
     
@@ -617,7 +747,10 @@ def draw_cover_title(draw, title, font, title_area_height, image_path):
     # Get colors from bottom 2/3 of image (not the title area) for contrast
     if os.path.exists(image_path):
         # Extract colors from bottom 2/3 of image
-        region_colors = _extract_colors_from_region(image_path, 1/3, 1)
+        try:
+            region_colors = _extract_quantized_colors(image_path, 50, 1/3, 1)
+        except Exception:
+            region_colors = ()
         
         if region_colors:
             # Find the MOST SATURATED color (not just brightest)
@@ -685,16 +818,32 @@ def draw_cover_title(draw, title, font, title_area_height, image_path):
             total_width += (bbox[2] - bbox[0]) + spacing
         return total_width - spacing if text else 0  # Remove trailing spacing
     
-    def draw_text_with_spacing(x, y, text, font, fill, spacing):
-        """Draw text character by character with custom letter spacing."""
-        current_x = x
+    def render_text_with_spacing(text, font, spacing):
+        """Rasterize text with custom letter spacing into an L mask.
+        
+        Each character is drawn once; the mask is then stamped for every
+        shadow, outline and fill layer. Returns the mask and its (left, top)
+        offset from the text origin.
+        """
+        chars = []
+        current_x = 0
         for char in text:
-            draw.text((current_x, y), char, font=font, fill=fill)
-            bbox = draw.textbbox((0, 0), char, font=font)
-            char_width = bbox[2] - bbox[0]
-            current_x += char_width + spacing
+            bbox = draw.textbbox((current_x, 0), char, font=font)
+            chars.append((char, current_x, bbox))
+            current_x += (bbox[2] - bbox[0]) + spacing
+        
+        left = min(bbox[0] for _, _, bbox in chars)
+        top = min(bbox[1] for _, _, bbox in chars)
+        right = max(bbox[2] for _, _, bbox in chars)
+        bottom = max(bbox[3] for _, _, bbox in chars)
+        
+        mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+        mask_draw = ImageDraw.Draw(mask)
+        for char, char_x, _ in chars:
+            mask_draw.text((char_x - left, -top), char, font=font, fill=255)
+        return mask, left, top
     
-    max_width = PAGE_WIDTH - (2 * TEXT_MARGIN)
+    max_width = TEXT_MAX_WIDTH
     
     # Wrap text to fit width (accounting for letter spacing)
     lines = wrap_text(title, font, max_width - (len(title) * COVER_TITLE_LETTER_SPACING), draw)
@@ -706,33 +855,56 @@ def draw_cover_title(draw, title, font, title_area_height, image_path):
     # Calculate starting Y position to center vertically in title area
     start_y = (title_area_height - total_text_height) // 2
     
+    # 3D shadow layers from back to front - darker layers further back
+    shadow_layers = []
+    for depth in range(COVER_TITLE_3D_DEPTH, 0, -1):
+        fade = depth / COVER_TITLE_3D_DEPTH
+        layer_color = (
+            int(shadow_color[0] * (1 - fade * 0.5)),
+            int(shadow_color[1] * (1 - fade * 0.5)),
+            int(shadow_color[2] * (1 - fade * 0.5))
+        )
+        shadow_layers.append((depth, layer_color))
+    
+    # Outline offsets in 8 directions around the main text
+    outline_steps = [-COVER_TITLE_OUTLINE_WIDTH, 0, COVER_TITLE_OUTLINE_WIDTH]
+    outline_offsets = [
+        (dx, dy) for dx in outline_steps for dy in outline_steps
+        if dx != 0 or dy != 0
+    ]
+    
     # Draw each line centered horizontally
     for i, line in enumerate(lines):
         text_width = get_text_width_with_spacing(line, font, COVER_TITLE_LETTER_SPACING)
         x = (PAGE_WIDTH - text_width) // 2
         y = start_y + (i * line_height)
+        line_mask, left, top = render_text_with_spacing(
+            line, font, COVER_TITLE_LETTER_SPACING
+        )
+        
+        def draw_line(line_x, line_y, fill):
+            draw.bitmap((line_x + left, line_y + top), line_mask, fill=fill)
         
         # Draw 3D shadow effect (multiple layers from back to front)
-        for depth in range(COVER_TITLE_3D_DEPTH, 0, -1):
-            # Calculate shadow color - darker layers further back
-            fade = depth / COVER_TITLE_3D_DEPTH
-            layer_color = (
-                int(shadow_color[0] * (1 - fade * 0.5)),
-                int(shadow_color[1] * (1 - fade * 0.5)),
-                int(shadow_color[2] * (1 - fade * 0.5))
-            )
-            shadow_x = x + depth
-            shadow_y = y + depth
-            draw_text_with_spacing(shadow_x, shadow_y, line, font, layer_color, COVER_TITLE_LETTER_SPACING)
+        for depth, layer_color in shadow_layers:
+            draw_line(x + depth, y + depth, layer_color)
         
-        # Draw outline/border (draw text in 8 directions around main text)
-        for dx in [-COVER_TITLE_OUTLINE_WIDTH, 0, COVER_TITLE_OUTLINE_WIDTH]:
-            for dy in [-COVER_TITLE_OUTLINE_WIDTH, 0, COVER_TITLE_OUTLINE_WIDTH]:
-                if dx != 0 or dy != 0:
-                    draw_text_with_spacing(x + dx, y + dy, line, font, outline_color, COVER_TITLE_LETTER_SPACING)
+        # Draw outline/border
+        for dx, dy in outline_offsets:
+            draw_line(x + dx, y + dy, outline_color)
         
         # Draw main title text
-        draw_text_with_spacing(x, y, line, font, title_color, COVER_TITLE_LETTER_SPACING)
+        draw_line(x, y, title_color)
+
+
+def save_page(page, output_path):
+    """Save a rendered page as a 300 DPI PNG.
+    
+    Pages are intermediate files that create_pdf.py re-encodes, so a fast
+    zlib level is used instead of PIL's default of 6.
+    """
+    page.save(output_path, 'PNG', dpi=(300, 300),
+              compress_level=PAGE_PNG_COMPRESS_LEVEL)
 
 
 def generate_cover_page(output_dir):
@@ -740,11 +912,13 @@ def generate_cover_page(output_dir):
     bg_path = "images/page_00_cover_bg.png"
     
     if os.path.exists(bg_path):
-        page = Image.open(bg_path).convert('RGB')
-        if page.size != (int(PAGE_WIDTH), int(PAGE_HEIGHT)):
-            page = page.resize((int(PAGE_WIDTH), int(PAGE_HEIGHT)), Image.Resampling.LANCZOS)
+        # The title colors are extracted from the same decode
+        page = _open_rgb(bg_path).copy()
+        if page.size != (PAGE_WIDTH, PAGE_HEIGHT):
+            page = page.resize((PAGE_WIDTH, PAGE_HEIGHT), Image.Resampling.LANCZOS,
+                               reducing_gap=REDUCING_GAP)
     else:
-        page = Image.new('RGB', (int(PAGE_WIDTH), int(PAGE_HEIGHT)), (255, 255, 255))
+        page = Image.new('RGB', (PAGE_WIDTH, PAGE_HEIGHT), (255, 255, 255))
     
     # Get book title and draw it
     title, _ = parse_story()
@@ -755,7 +929,7 @@ def generate_cover_page(output_dir):
     draw_cover_title(draw, title, title_font, title_area_height, bg_path)
     
     output_path = os.path.join(output_dir, "page_00_cover.png")
-    page.save(output_path, dpi=(300, 300))
+    save_page(page, output_path)
     print(f"  ✅ Created: {output_path}")
     return page
 
@@ -769,7 +943,7 @@ def generate_story_page(page_number, page_data, output_dir):
     page = create_story_page_with_image_and_text(page_number, bg_path, main_image_path, text)
     
     output_path = os.path.join(output_dir, f"page_{page_number:02d}.png")
-    page.save(output_path, dpi=(300, 300))
+    save_page(page, output_path)
     print(f"  ✅ Created: {output_path}")
     return page
 
@@ -781,10 +955,11 @@ def generate_end_page(page_number, output_dir):
     # Load background image like cover page does
     if os.path.exists(bg_path):
         page = Image.open(bg_path).convert('RGB')
-        if page.size != (int(PAGE_WIDTH), int(PAGE_HEIGHT)):
-            page = page.resize((int(PAGE_WIDTH), int(PAGE_HEIGHT)), Image.Resampling.LANCZOS)
+        if page.size != (PAGE_WIDTH, PAGE_HEIGHT):
+            page = page.resize((PAGE_WIDTH, PAGE_HEIGHT), Image.Resampling.LANCZOS,
+                               reducing_gap=REDUCING_GAP)
     else:
-        page = Image.new('RGB', (int(PAGE_WIDTH), int(PAGE_HEIGHT)), (255, 255, 255))
+        page = Image.new('RGB', (PAGE_WIDTH, PAGE_HEIGHT), (255, 255, 255))
     
     draw = ImageDraw.Draw(page)
     
@@ -821,7 +996,7 @@ def generate_end_page(page_number, output_dir):
     total_height = visit_height + line_spacing + url_height + qr_spacing + qr_size
     
     # Draw black background bar covering the bottom 1/6 of the page
-    black_bar_top = int(PAGE_HEIGHT * 5 // 6)
+    black_bar_top = PAGE_HEIGHT * 5 // 6
     black_bar_height = PAGE_HEIGHT - black_bar_top
     draw.rectangle([0, black_bar_top, PAGE_WIDTH, PAGE_HEIGHT], fill=black_color)
     
@@ -845,10 +1020,19 @@ def generate_end_page(page_number, output_dir):
     page.paste(qr_img, (qr_x, qr_y))
     
     output_path = os.path.join(output_dir, f"page_{page_number:02d}_end.png")
-    page.save(output_path, dpi=(300, 300))
+    save_page(page, output_path)
     print(f"  ✅ Created: {output_path}")
     return page
 
+def render_job(generate_func, *args):
+    """Run a page generator in a worker process.
+    
+    The rendered page is already saved to disk, so the returned image is
+    dropped instead of being pickled back to the parent process.
+    """
+    generate_func(*args)
+
+
 def main():
     """Generate all book pages from story.json."""
     output_dir = "pages"
@@ -862,19 +1046,30 @@ def main():
     print(f"Background opacity: radial gradient {int(BG_OPACITY_CENTER * 100)}% (center) to {int(BG_OPACITY_EDGE * 100)}% (edge)")
     print("=" * 60)
     
-    # Generate cover
-    print(f"Generating cover page (1/{total_pages})...")
-    generate_cover_page(output_dir)
-    
-    # Generate story pages
-    for i, page_data in enumerate(story_pages, start=1):
-        print(f"Generating story page {i} ({i + 1}/{total_pages})...")
-        generate_story_page(i, page_data, output_dir)
-    
-    # Generate end page
-    end_page_num = len(story_pages) + 1
-    print(f"Generating end page ({total_pages}/{total_pages})...")
-    generate_end_page(end_page_num, output_dir)
+    # Pages are independent, so render them in parallel across CPU cores
+    with ProcessPoolExecutor(max_workers=RENDER_WORKERS) as executor:
+        jobs = []
+        
+        # Generate cover
+        print(f"Generating cover page (1/{total_pages})...")
+        jobs.append(executor.submit(render_job, generate_cover_page,
+                                    output_dir))
+        
+        # Generate story pages
+        for i, page_data in enumerate(story_pages, start=1):
+            print(f"Generating story page {i} ({i + 1}/{total_pages})...")
+            jobs.append(executor.submit(render_job, generate_story_page,
+                                        i, page_data, output_dir))
+        
+        # Generate end page
+        end_page_num = len(story_pages) + 1
+        print(f"Generating end page ({total_pages}/{total_pages})...")
+        jobs.append(executor.submit(render_job, generate_end_page,
+                                    end_page_num, output_dir))
+        
+        # Surface the first worker error, if any
+        for job in jobs:
+            job.result()
     
     print("=" * 60)
     print(f"✅ All {total_pages} pages generated!")
@@ -8,6 +8,8 @@ import os
 import json
 from datetime import datetime, timedelta
 import google.generativeai as genai
+import gemini_cache
+from file_utils import atomic_write
 
 def get_current_week_dates():
     """Get the start and end dates of the current week."""
@@ -27,104 +29,71 @@ def generate_story_prompt():
         raise ValueError("GEMINI_API_KEY environment variable is required")
     
     genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    # JSON mode returns raw JSON, so no markdown fences need stripping
+    model = genai.GenerativeModel(
+        "gemini-2.5-flash",
+        generation_config={"response_mime_type": "application/json"}
+    )
     
     start_date, end_date = get_current_week_dates()
     today = datetime.now().strftime("%B %d, %Y")
     
-    # First, ask Gemini about movies released this week
-    movie_prompt = f"""
+    # Pick a movie and build the story concept in a single request, so the
+    # book waits for one model round trip instead of two
+    book_prompt = f"""
     Today is {today}. 
     
     Think about popular movies that were released around this date ({start_date} to {end_date}) 
     in recent years, or any notable movie releases happening now.
     
-    Pick ONE family-friendly or popular movie and provide the following information in JSON format:
+    Pick ONE family-friendly or popular movie that has elements suitable for inspiring a
+    children's story. Then, based on that movie, create a children's storybook concept
+    without copyright issues for ages 4-8 years old.
+    
+    Create a NEW, ORIGINAL children's story that:
+    1. Uses the SAME protagonist name as the movie
+    2. Follows a SIMILAR genre and theme (but age-appropriate for 4-8 year olds)
+    3. Has a positive message about friendship, courage, kindness, or learning
+    4. Is engaging with colorful, imaginative scenes perfect for illustration
+    5. Is NOT a retelling of the movie, but inspired by its themes
+    
+    Provide your response in this JSON format:
     {{
         "movie_name": "Name of the movie",
         "genre": "Primary genre (adventure, fantasy, comedy, action, etc.)",
         "protagonist_name": "Main character's name",
         "movie_theme": "Brief description of the movie's main theme",
-        "release_info": "Brief note about when it was released"
+        "release_info": "Brief note about when it was released",
+        "title": "A catchy, child-friendly title",
+        "story_concept": "A 2-3 sentence description of the story",
+        "story_prompt": "A detailed prompt that will be used to generate a 20-page illustrated children's book. Include the main character, setting, plot points, and the lesson/moral of the story."
     }}
     
-    Choose a movie that has elements suitable for inspiring a children's story.
-    Return ONLY the JSON, no other text.
+    Make sure the content is 100% appropriate for young children (ages 4-8) and free of any copyrighted material.
     """
     
-    movie_response = model.generate_content(movie_prompt)
-    movie_text = movie_response.text.strip()
-    
-    # Clean up the response (remove markdown code blocks if present)
-    if movie_text.startswith("```"):
-        movie_text = movie_text.split("```")[1]
-        if movie_text.startswith("json"):
-            movie_text = movie_text[4:]
-    movie_text = movie_text.strip()
+    response_text = gemini_cache.load_response(model, book_prompt)
+    cached = response_text is not None
+    if not cached:
+        response_text = model.generate_content(book_prompt).text.strip()
     
     try:
-        movie_info = json.loads(movie_text)
+        movie_info = json.loads(response_text)
     except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse movie information from Gemini response: {e}\nResponse was: {movie_text}")
+        raise ValueError(f"Failed to parse story concept from Gemini response: {e}\nResponse was: {response_text}")
+    
+    if cached:
+        print("Reusing cached story concept")
+    else:
+        gemini_cache.save_response(model, book_prompt, response_text)
     
     print(f"Selected movie: {movie_info.get('movie_name', 'Unknown')}")
     print(f"Genre: {movie_info.get('genre', 'Unknown')}")
     print(f"Protagonist: {movie_info.get('protagonist_name', 'Unknown')}")
     
-    # Now generate a children's story prompt based on the movie
-    story_prompt = f"""
-    Based on the following movie information, create a children's storybook concept without copyright issues
-    for ages 4-8 years old:
-    
-    Movie: {movie_info.get('movie_name')}
-    Genre: {movie_info.get('genre')}
-    Protagonist Name: {movie_info.get('protagonist_name')}
-    Theme: {movie_info.get('movie_theme')}
-    
-    Create a NEW, ORIGINAL children's story that:
-    1. Uses the SAME protagonist name as the movie
-    2. Follows a SIMILAR genre and theme (but age-appropriate for 4-8 year olds)
-    3. Has a positive message about friendship, courage, kindness, or learning
-    4. Is engaging with colorful, imaginative scenes perfect for illustration
-    5. Is NOT a retelling of the movie, but inspired by its themes
-    
-    Provide your response in this exact format:
-    
-    TITLE: [A catchy, child-friendly title]
-    
-    STORY CONCEPT: [A 2-3 sentence description of the story]
-    
-    STORY PROMPT: [A detailed prompt that will be used to generate a 20-page illustrated children's book. 
-    Include the main character, setting, plot points, and the lesson/moral of the story.]
-    
-    Make sure the content is 100% appropriate for young children (ages 4-8) and free of any copyrighted material.
-    """
-    
-    story_response = model.generate_content(story_prompt)
-    story_text = story_response.text.strip()
-    
-    # Parse the response to extract title and story prompt
-    lines = story_text.split('\n')
-    title = ""
-    story_concept = ""
-    story_prompt_text = ""
-    
-    current_section = None
-    for line in lines:
-        line = line.strip()
-        if line.startswith("TITLE:"):
-            title = line.replace("TITLE:", "").strip()
-            current_section = "title"
-        elif line.startswith("STORY CONCEPT:"):
-            story_concept = line.replace("STORY CONCEPT:", "").strip()
-            current_section = "concept"
-        elif line.startswith("STORY PROMPT:"):
-            story_prompt_text = line.replace("STORY PROMPT:", "").strip()
-            current_section = "prompt"
-        elif current_section == "concept" and line:
-            story_concept += " " + line
-        elif current_section == "prompt" and line:
-            story_prompt_text += " " + line
+    title = movie_info.get("title", "").strip()
+    story_concept = " ".join(movie_info.get("story_concept", "").split())
+    story_prompt_text = " ".join(movie_info.get("story_prompt", "").split())
     
     # Create the final prompt.txt content
     prompt_content = f"""Title: {title}
@@ -140,8 +109,7 @@ Story Concept: {story_concept}
 Generate exactly 20 pages with one illustration prompt per page."""
     
     # Write to prompt.txt
-    with open("prompt.txt", "w") as f:
-        f.write(prompt_content)
+    atomic_write("prompt.txt", prompt_content)
     
     print("\n" + "="*50)
     print("Generated prompt.txt successfully!")
@@ -173,10 +141,12 @@ def main():
         else:
             # Use the issue content directly (original behavior)
             print("Using issue content as story prompt...")
-            with open("prompt.txt", "w") as f:
-                f.write(f"Title: {issue_title}\n\n")
-                f.write(f"Story prompt: {issue_body}\n")
-                f.write("Generate exactly 20 pages with one illustration prompt per page.")
+            atomic_write(
+                "prompt.txt",
+                f"Title: {issue_title}\n\n"
+                f"Story prompt: {issue_body}\n"
+                "Generate exactly 20 pages with one illustration prompt per page."
+            )
     else:
         # Running locally - generate based on current movies
         print("Running locally - generating story prompt based on current movie releases...")
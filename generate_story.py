@@ -1,10 +1,44 @@
 # generate_story.py
 import google.generativeai as genai
+import gemini_cache
+from file_utils import atomic_write
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+# Set STREAM_IMAGES=1 to start downloading each page's illustration as soon
+# as the page arrives, while the rest of the story is still being written.
+# generate_images.py then skips every image that is already up to date.
+STREAM_IMAGES = os.getenv("STREAM_IMAGES") == "1"
+IMAGE_DIR = "images"
+
+
+def stream_pages(text_chunks):
+    """Yield page objects from a streamed JSON array as each one completes."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    for text in text_chunks:
+        buffer += text
+        while True:
+            buffer = buffer.lstrip(" \t\r\n[,")
+            try:
+                page, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break  # Page is incomplete; wait for the next chunk
+            buffer = buffer[end:]
+            yield page
+    
+    buffer = buffer.strip()
+    if buffer not in ("", "]"):
+        raise ValueError(f"Failed to parse story JSON from Gemini response: {buffer[:500]}...")
+
 
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-2.5-flash')
+# JSON mode returns raw JSON, so no markdown fences need stripping
+model = genai.GenerativeModel(
+    'gemini-2.5-flash',
+    generation_config={"response_mime_type": "application/json"}
+)
 
 prompt = open("prompt.txt").read() + """
 
@@ -21,30 +55,56 @@ Return ONLY valid JSON, no other text. Example format:
 ]
 """
 
-response = model.generate_content(prompt)
-text = response.text.strip()
+cached_text = gemini_cache.load_response(model, prompt)
+if cached_text is not None:
+    print("Reusing cached story")
+    text_chunks = [cached_text]
+else:
+    response = model.generate_content(prompt, stream=True)
+    text_chunks = (chunk.text for chunk in response)
 
-# Clean up the response (remove markdown code blocks if present)
-if text.startswith("```"):
-    text = text.split("```")[1]
-    if text.startswith("json"):
-        text = text[4:]
-text = text.strip()
+if STREAM_IMAGES:
+    # Imported here so generating only the story needs no image dependencies
+    import generate_images
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    generate_images.start_retry_budget()
+    generate_images.start_resize_workers()
+    image_executor = ThreadPoolExecutor(max_workers=generate_images.MAX_WORKERS)
 
-# Parse JSON
+story_data = []
+image_jobs = {}  # future -> page number
 try:
-    story_data = json.loads(text)
-except json.JSONDecodeError as e:
-    raise ValueError(f"Failed to parse story JSON from Gemini response: {e}\nResponse was: {text[:500]}...")
-
-# Save the full story JSON
-with open("story.json", "w") as f:
-    json.dump(story_data, f, indent=2)
-
-# Extract image prompts for backward compatibility
-image_prompts = [page["image"] for page in story_data]
-with open("image_prompts.json", "w") as f:
-    json.dump(image_prompts, f, indent=2)
+    for page in stream_pages(text_chunks):
+        if not (isinstance(page, dict) and "story" in page and "image" in page):
+            raise ValueError(f"Invalid page in Gemini response: {str(page)[:500]}")
+        story_data.append(page)
+        print(f"  📝 Page {len(story_data)} written")
+        if STREAM_IMAGES:
+            future = image_executor.submit(
+                generate_images.generate_image, page["image"],
+                f"{IMAGE_DIR}/page_{len(story_data):02d}.png"
+            )
+            image_jobs[future] = len(story_data)
+    if not story_data:
+        raise ValueError("Gemini response contained no story pages")
+    
+    # Save the full story JSON
+    atomic_write("story.json", json.dumps(story_data, indent=2))
+    if cached_text is None:
+        gemini_cache.save_response(model, prompt, json.dumps(story_data))
+    
+    # Extract image prompts for backward compatibility
+    image_prompts = [page["image"] for page in story_data]
+    atomic_write("image_prompts.json", json.dumps(image_prompts, indent=2))
+finally:
+    if STREAM_IMAGES:
+        image_executor.shutdown(wait=True)
+        generate_images.stop_resize_workers()
+        # The story is saved either way; generate_images.py retries these
+        for future, page_num in image_jobs.items():
+            error = future.exception()
+            if error is not None:
+                print(f"  ⚠️ Image for page {page_num} failed: {error!r}")
 
 print(f"✅ Generated {len(story_data)} pages")
 print(f"📄 Saved: story.json, story.txt, image_prompts.json")
\ No newline at end of file
@@ -4,16 +4,18 @@
 # Page dimensions: 6x9 inches at 300 DPI (for image generation)
 DPI = 300
 SCALE_FACTOR = 3
-PAGE_WIDTH = 6.25 * DPI   # 6.25 inches * 300 DPI
-PAGE_HEIGHT = 9.25 * DPI  # 9.25 inches * 300 DPI
+PAGE_WIDTH = 1875   # 6.25 inches * 300 DPI
+PAGE_HEIGHT = 2775  # 9.25 inches * 300 DPI
+# Pixel sizes are kept as ints so they can be passed straight to PIL
+assert PAGE_WIDTH == int(6.25 * DPI) and PAGE_HEIGHT == int(9.25 * DPI)
 
 # Image generation dimensions (pre-scaled, before SCALE_FACTOR is applied)
-IMAGE_GEN_WIDTH = PAGE_WIDTH // SCALE_FACTOR   # 600 pixels
-IMAGE_GEN_HEIGHT = PAGE_HEIGHT // SCALE_FACTOR  # 900 pixels
+IMAGE_GEN_WIDTH = PAGE_WIDTH // SCALE_FACTOR   # 625 pixels
+IMAGE_GEN_HEIGHT = PAGE_HEIGHT // SCALE_FACTOR  # 925 pixels
 
-# PDF page dimensions: 6x9 inches in points (72 points per inch)
-PDF_PAGE_WIDTH = (PAGE_WIDTH / DPI) * 72   # 432 points
-PDF_PAGE_HEIGHT = (PAGE_HEIGHT / DPI) * 72  # 648 points
+# PDF page dimensions in points (72 points per inch)
+PDF_PAGE_WIDTH = PAGE_WIDTH * 72 // DPI   # 450 points
+PDF_PAGE_HEIGHT = PAGE_HEIGHT * 72 // DPI  # 666 points
 
 # Radial gradient opacity settings
 BG_OPACITY_CENTER = 0.03  # 3% opacity at center